@@ -0,0 +1,45 @@
+"""Per-frame axis filter math for the controller reader thread.
+
+Kept free of object state so it runs as one tight loop over the raw and
+filtered axis lists (see controller_handler.AXES for the index order).
+
+Axis values are Q15 fixed-point ints: Q_ONE is 1.0, so sticks span
+-Q_ONE..Q_ONE and throttle 0..Q_ONE, and no float math is needed anywhere
+between the raw event and the RC value.
+"""
+
+Q_SHIFT = 15
+Q_ONE = 1 << Q_SHIFT
+
+# Inputs below this magnitude are treated as centered (inside the deadzone)
+ZERO_EPS = round(0.01 * Q_ONE)
+
+# Per-update decay applied to the filter while the input is centered
+CENTER_DECAY = round(0.7 * Q_ONE)
+
+
+def to_fixed(x):
+    """Convert a float like 0.25 to Q15"""
+    return round(x * Q_ONE)
+
+
+def update(raw, filt, alpha):
+    """Low-pass filter raw into filt in place (alpha in Q15)"""
+    # Module constants as locals: LOAD_FAST instead of LOAD_GLOBAL per axis
+    eps = ZERO_EPS
+    decay = CENTER_DECAY
+    shift = Q_SHIFT
+    for i in range(len(filt)):
+        val = raw[i]
+        f = filt[i]
+
+        if -eps < val < eps:
+            # Aggressive decay toward zero to prevent drift accumulation
+            f = (f * decay) >> shift
+            if -eps < f < eps:  # If very small, snap to zero
+                f = 0
+        else:
+            # First-order low-pass filter for active input
+            f += (alpha * (val - f)) >> shift
+
+        filt[i] = f
@@ -1,7 +1,93 @@
-import evdev
-from evdev import ecodes
+import ctypes
+import ctypes.util
+import math
+import os
+import selectors
 import threading
-import time
+from struct import Struct
+
+import evdev
+# Event type/code constants bound once at import; the reader thread compares
+# against these for every event
+from evdev.ecodes import (
+    EV_SYN, EV_KEY, EV_ABS, SYN_REPORT, ABS_MAX,
+    ABS_X, ABS_RX, ABS_RY, ABS_RZ, ABS_HAT0X, ABS_HAT0Y,
+    BTN_SOUTH, BTN_EAST, BTN_NORTH, BTN_WEST, BTN_SELECT, BTN_START, BTN_MODE,
+    BTN_TL, BTN_TR, BTN_TL2, BTN_TR2, BTN_THUMBL, BTN_THUMBR
+)
+
+try:
+    import pyudev
+except ImportError:
+    # Optional: without it find_device() opens every /dev/input node
+    pyudev = None
+
+import control_kernel
+
+# struct input_event from <linux/input.h>: timeval (sec, usec), type, code, value
+# (compiled once; iter_unpack then never re-parses the format string)
+EVENT_FORMAT = "llHHi"
+EVENT_STRUCT = Struct(EVENT_FORMAT)
+EVENT_SIZE = EVENT_STRUCT.size
+
+# Maximum events drained per wake-up (one PS4 frame is usually under 10)
+READ_BATCH = 64
+
+# Real-time priority for the reader thread (1-99, needs CAP_SYS_NICE)
+RT_PRIORITY = 50
+
+# mlockall() flags from <sys/mman.h>
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+def lock_memory():
+    """Lock current and future pages in RAM so the control path never page-faults"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if libc.mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        return True
+    except (OSError, AttributeError) as e:
+        print(f"⚠️ mlockall unavailable ({e}), memory may be paged out")
+        return False
+
+def set_realtime_priority(priority=RT_PRIORITY):
+    """Switch the calling thread to SCHED_FIFO"""
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+        return True
+    except (OSError, AttributeError) as e:
+        print(f"⚠️ SCHED_FIFO unavailable ({e}), controller runs at normal priority")
+        return False
+
+# Axis order of the filter state lists used by the reader thread
+AXES = ("roll", "pitch", "yaw", "throttle")
+AXIS_INDEX = {name: i for i, name in enumerate(AXES)}
+
+# RC mapping per axis: sticks -1.0..1.0 -> 1000..2000, throttle 0.0..1.0 -> 1000..2000
+RC_BASE = (1500, 1500, 1500, 1000)
+RC_SPAN = (500, 500, 500, 1000)
+
+# Axis state is Q15 fixed point (see control_kernel)
+Q_SHIFT = control_kernel.Q_SHIFT
+Q_ONE = control_kernel.Q_ONE
+
+class AxisState:
+    """Per-axis values with fixed slots instead of a string-keyed dict.
+
+    Published RC frames are treated as immutable: the reader thread replaces
+    ControllerHandler.rc_values with a new instance instead of mutating it.
+    """
+    __slots__ = ("roll", "pitch", "yaw", "throttle")
+
+    def __init__(self, roll=0, pitch=0, yaw=0, throttle=0):
+        self.roll = roll
+        self.pitch = pitch
+        self.yaw = yaw
+        self.throttle = throttle
+
+    def to_dict(self):
+        return {"roll": self.roll, "pitch": self.pitch, "throttle": self.throttle, "yaw": self.yaw}
 
 class ControllerHandler:
     """Handles PS4 Controller input via evdev for RPi"""
@@ -9,55 +95,93 @@ class ControllerHandler:
     def __init__(self, device_name="Wireless Controller"):
         self.device = None
         self.device_name = device_name
-        self.rc_values = {"roll": 1500, "pitch": 1500, "throttle": 1000, "yaw": 1500}
+        self.rc_values = AxisState(roll=1500, pitch=1500, yaw=1500, throttle=1000)
+        self._rc_cache = None
+        self._rc_cache_frame = None
+        self._rc_cache_test_mode = False
         self.buttons = {}
         self.last_button = None
         self.running = False
         self.thread = None
+        self.input_seq = 0  # Incremented after every burst of input is processed
+        self.input_ready = threading.Event()  # Set after input_seq is incremented
         
         # Test mode: Force roll and yaw to center (1500) to test for stick drift issues
         self.test_mode_force_center = False
         
-        # PS4 stick mapping (evdev)
-        # ABS_X: Left X (Yaw), ABS_Y: Left Y (Throttle)
-        # ABS_RX: Right X (Roll), ABS_RY: Right Y (Pitch)
+        # Mode 2 Layout:
+        # ABS_RZ: Throttle (Trigger R2, 0 to 255)
+        # ABS_X: Yaw (Left Stick X)
+        # ABS_RX: Roll (Right Stick X)
+        # ABS_RY: Pitch (Right Stick Y, Inverted)
+        # ABS_HAT0X/Y: D-pad
         self.axis_map = {
-            ecodes.ABS_X: "yaw",
-            ecodes.ABS_Y: "throttle",
-            ecodes.ABS_RX: "roll",
-            ecodes.ABS_RY: "pitch"
+            ABS_X: "yaw",
+            ABS_RX: "roll",
+            ABS_RY: "pitch",
+            ABS_RZ: "throttle",
+            ABS_HAT0X: "dpad_x",
+            ABS_HAT0Y: "dpad_y"
         }
         
+        # D-pad state
+        self.dpad = {"x": 0, "y": 0}
+        
+    def _candidate_paths(self):
+        """Yield input nodes to try: udev-tagged joysticks first, then every other node"""
+        paths = []
+        if pyudev is not None:
+            try:
+                context = pyudev.Context()
+                paths = [d.device_node for d in context.list_devices(subsystem="input", ID_INPUT_JOYSTICK="1")
+                         if d.device_node and d.sys_name.startswith("event")]
+            except Exception:
+                paths = []
+        yield from paths
+
+        # No udev, or the controller's node isn't tagged: scan the rest of
+        # /dev/input (only reached if no tagged node was the main node)
+        tried = set(paths)
+        for path in evdev.list_devices():
+            if path not in tried:
+                yield path
+
     def find_device(self):
         """Find the controller device by name with improved robustness"""
-        for path in evdev.list_devices():
+        fallback = None
+        for path in self._candidate_paths():
             try:
                 device = evdev.InputDevice(path)
-                if self.device_name in device.name:
-                    # Filter out non-main nodes
-                    if "Touchpad" in device.name or "Motion Sensors" in device.name:
-                        continue
-                        
-                    caps = device.capabilities()
-                    if ecodes.EV_KEY in caps and ecodes.EV_ABS in caps:
-                        self.device = device
-                        print(f"✅ Found {device.name} (Main Node) at {device.path}")
-                        return True
-            except Exception as e:
+            except Exception:
                 # Some devices might not allow access, skip them
                 continue
-        
-        # Fallback: any device with the name
-        for path in evdev.list_devices():
-            try:
-                device = evdev.InputDevice(path)
-                if self.device_name in device.name:
+
+            if self.device_name not in device.name:
+                device.close()
+                continue
+
+            # Filter out non-main nodes
+            if "Touchpad" not in device.name and "Motion Sensors" not in device.name:
+                caps = device.capabilities()
+                if EV_KEY in caps and EV_ABS in caps:
+                    if fallback:
+                        fallback.close()
                     self.device = device
-                    print(f"⚠️ Found {device.name} (Partial Node) at {device.path}")
+                    print(f"✅ Found {device.name} (Main Node) at {device.path}")
                     return True
-            except:
-                continue
-                
+
+            # Remember the first partial match in case no main node shows up
+            if fallback is None:
+                fallback = device
+            else:
+                device.close()
+
+        # Fallback: any device with the name
+        if fallback:
+            self.device = fallback
+            print(f"⚠️ Found {fallback.name} (Partial Node) at {fallback.path}")
+            return True
+
         return False
 
     def start(self):
@@ -67,143 +191,184 @@ class ControllerHandler:
                 print(f"❌ Could not find {self.device_name}")
                 return False
         
-        # Mode 2 Layout:
-        # ABS_RZ: Throttle (Trigger R2, 0 to 255)
-        # ABS_X: Yaw (Left Stick X)
-        # ABS_RX: Roll (Right Stick X)
-        # ABS_RY: Pitch (Right Stick Y, Inverted)
-        # ABS_HAT0X/Y: D-pad
-        self.axis_map = {
-            ecodes.ABS_X: "yaw",
-            ecodes.ABS_RX: "roll",
-            ecodes.ABS_RY: "pitch",
-            ecodes.ABS_RZ: "throttle",
-            ecodes.ABS_HAT0X: "dpad_x",
-            ecodes.ABS_HAT0Y: "dpad_y"
-        }
-        
-        # D-pad state
-        self.dpad = {"x": 0, "y": 0}
-        
-        # Load capabilities
-        self.abs_info = {}
-        caps = self.device.capabilities().get(ecodes.EV_ABS, [])
-        for code, info in caps:
-            if code in self.axis_map:
-                self.abs_info[code] = info
-
         # Filter parameters
         self.ALPHA = 0.25
         
         # Deadzone: Increase from 5% to 10% to better handle stick drift
         self.DEADZONE_PERCENT = 0.10
         
+        # Load capabilities once; the axis ranges never change while connected
+        self.abs_info = {code: info for code, info in self.device.capabilities().get(EV_ABS, [])}
+
+        # Flat table indexed by ABS code, built once so the reader thread does
+        # no key lookups or string compares per event:
+        #   (center, span, deadzone, sign, AXES index)
+        # and the Q15 value is (value - center) * Q_ONE // span.
+        # Throttle uses its minimum as center and no deadzone, so it maps 0.0 to 1.0.
+        self._axis_tbl = [None] * (ABS_MAX + 1)
+        self._dpad_map = {}
+        for code, key in self.axis_map.items():
+            if "dpad" in key:
+                # D-pad: usually -1, 0, 1. Stored directly.
+                self._dpad_map[code] = key[-1]
+                continue
+
+            info = self.abs_info.get(code)
+            if not info or info.max <= info.min:
+                continue
+
+            if key == "throttle":
+                # Trigger: 0 to 255 -> 0.0 to 1.0 (no center, no deadzone needed usually)
+                entry = (info.min, info.max - info.min, 0, 1, AXIS_INDEX[key])
+            else:
+                # Stick: centered mapping with configurable deadzone (default 10%)
+                center = (info.max + info.min) // 2
+                max_range = (info.max - info.min) // 2
+                sign = -1 if key == "pitch" else 1  # Push stick forward = pitch down
+                deadzone = math.ceil(max_range * self.DEADZONE_PERCENT)  # In raw units
+                entry = (center, max_range, deadzone, sign, AXIS_INDEX[key])
+            self._axis_tbl[code] = entry
+
         print(f"🎮 Connected to {self.device.name} at {self.device.path}")
+        lock_memory()
         self.running = True
         self.thread = threading.Thread(target=self._run, daemon=True)
         self.thread.start()
         return True
 
-    def _normalize(self, value, info, key, invert=False):
-        """Normalizes stick/trigger/dpad input"""
-        if key == "throttle":
-            # Trigger: 0 to 255 -> 0.0 to 1.0 (no center, no deadzone needed usually)
-            n = (value - info.min) / (info.max - info.min)
-            return n if not invert else (1.0 - n)
-        elif "dpad" in key:
-            # D-pad: usually -1, 0, 1. Just return directly.
-            return value
-        else:
-            # Stick: centered mapping with 5% deadzone
-            center = (info.max + info.min) // 2
-            max_range = (info.max - info.min) // 2
-            
-            delta = value - center
-            if abs(delta) < (max_range * self.DEADZONE_PERCENT): # Configurable deadzone (default 10%)
-                return 0.0
-                
-            n = max(-1.0, min(1.0, delta / max_range))
-            return -n if invert else n
-
-    def _apply_lpf(self, new, old):
-        """First-order low-pass filter"""
-        return self.ALPHA * new + (1 - self.ALPHA) * old
-
     def _run(self):
-        """Background thread to read events with LPF"""
-        # Internal state for LPF
-        # Sticks are -1.0 to 1.0, Throttle is 0.0 to 1.0
-        filtered_state = {"roll": 0.0, "pitch": 0.0, "yaw": 0.0, "throttle": 0.0}
-        raw_state = {"roll": 0.0, "pitch": 0.0, "yaw": 0.0, "throttle": 0.0}
+        """Background thread to read events with LPF.
+
+        Axis events are only accumulated here; the LPF runs once per
+        SYN_REPORT, when the kernel has delivered the whole frame, and the RC
+        values are published once per wake-up after the queue is drained.
+        """
+        # Soft real-time loop: don't let other processes delay input handling
+        set_realtime_priority()
+
+        # Internal state for LPF, indexed in AXES order
+        # Sticks are -1.0 to 1.0, Throttle is 0.0 to 1.0, both in Q15
+        filtered_state = [0] * len(AXES)
+        raw_state = [0] * len(AXES)
+        frame_dirty = False
+        filter_dirty = False
+
+        # Hot-path attributes bound to locals once for the lifetime of the thread
+        axis_tbl = self._axis_tbl
+        dpad_map = self._dpad_map
+        dpad = self.dpad
+        buttons = self.buttons
+        alpha = control_kernel.to_fixed(self.ALPHA)
+        one = Q_ONE
+        update_filter = control_kernel.update
+        unpack_events = EVENT_STRUCT.iter_unpack
+
+        # Raw event reads reuse one buffer for the lifetime of the thread
+        fd = self.device.fd
+        buf = bytearray(EVENT_SIZE * READ_BATCH)
+        view = memoryview(buf)
+
+        # Register the device once; each select() is then a single epoll_wait
+        selector = selectors.DefaultSelector()
+        selector.register(fd, selectors.EVENT_READ)
 
         try:
-            for event in self.device.read_loop():
-                if not self.running:
-                    break
-                
-                # Handle axes (Sticks, Triggers, D-pad)
-                if event.type == ecodes.EV_ABS:
-                    if event.code in self.axis_map:
-                        key = self.axis_map[event.code]
-                        info = self.abs_info.get(event.code)
-                        
-                        if info:
-                            # Normalize
-                            invert = False
-                            if key == "pitch": # Push stick forward = pitch down
-                                invert = True
-                            
-                            val = self._normalize(event.value, info, key, invert=invert)
-                            
-                            if "dpad" in key:
-                                if key == "dpad_x":
-                                    self.dpad["x"] = val
-                                else:
-                                    self.dpad["y"] = val
-                            else:
-                                raw_state[key] = val
-                                
-                                # Update filtered state for this specific axis only
-                                # If value is 0 (within deadzone), decay more aggressively toward 0
-                                if abs(val) < 0.01:  # Very close to zero (within deadzone)
-                                    # Aggressive decay toward zero to prevent drift accumulation
-                                    filtered_state[key] = filtered_state[key] * 0.7  # Decay 30% per update
-                                    if abs(filtered_state[key]) < 0.01:  # If very small, snap to zero
-                                        filtered_state[key] = 0.0
-                                else:
-                                    # Normal LPF for active input
-                                    filtered_state[key] = self._apply_lpf(val, filtered_state[key])
-                                
-                                # Convert to 1000-2000 for RC
-                                if key == "throttle":
-                                    # 0.0 to 1.0 -> 1000 to 2000
-                                    self.rc_values["throttle"] = int(1000 + (filtered_state["throttle"] * 1000))
-                                else:
-                                    # -1.0 to 1.0 -> 1000 to 2000 (center 1500)
-                                    self.rc_values[key] = int(1500 + (filtered_state[key] * 500))
-                                
-                # Handle buttons
-                elif event.type == ecodes.EV_KEY:
-                    self.buttons[event.code] = event.value
-                    if event.value == 1:
-                        self.last_button = event.code
-                    
+            while self.running:
+                # Wait for input, waking up periodically to check self.running
+                if not selector.select(timeout=0.1):
+                    continue
+
+                # Drain everything the kernel has queued in one burst, straight
+                # into the reused buffer (no InputEvent objects per event)
+                try:
+                    nbytes = os.readv(fd, [buf])
+                except BlockingIOError:
+                    continue
+                if not nbytes:
+                    raise OSError("device closed")
+
+                for _, _, ev_type, code, value in unpack_events(view[:nbytes]):
+                    # Handle axes (Sticks, Triggers, D-pad)
+                    if ev_type == EV_ABS:
+                        entry = axis_tbl[code]
+                        if entry is not None:
+                            center, span, deadzone, sign, idx = entry
+                            delta = value - center
+                            # Branchless deadzone: the bool mask zeroes the value inside it
+                            raw_state[idx] = max(-one, min(one, delta * one // span)) * sign * (abs(delta) >= deadzone)
+                            frame_dirty = True
+                        elif code in dpad_map:
+                            dpad[dpad_map[code]] = value
+
+                    # Handle buttons
+                    elif ev_type == EV_KEY:
+                        buttons[code] = value
+                        if value == 1:
+                            self.last_button = code
+
+                    # End of frame: filter all axes once
+                    elif ev_type == EV_SYN and code == SYN_REPORT:
+                        if frame_dirty:
+                            update_filter(raw_state, filtered_state, alpha)
+                            frame_dirty = False
+                            filter_dirty = True
+
+                # Publish only the newest filtered frame of this burst
+                if filter_dirty:
+                    self._publish_rc(filtered_state)
+                    filter_dirty = False
+
+                # Wake anyone waiting in wait_for_input()
+                self.input_seq += 1
+                self.input_ready.set()
+
         except Exception as e:
             print(f"❌ Controller error: {e}")
             self.running = False
+        finally:
+            selector.close()
+
+    def _publish_rc(self, filtered_state):
+        """Convert the filtered axes to RC values and publish them if they changed"""
+        # Convert Q15 to 1000-2000 for RC with integer math only, clamping
+        # here once per frame rather than in every get_rc_values() rebuild
+        roll = max(1000, min(2000, RC_BASE[0] + ((filtered_state[0] * RC_SPAN[0]) >> Q_SHIFT)))
+        pitch = max(1000, min(2000, RC_BASE[1] + ((filtered_state[1] * RC_SPAN[1]) >> Q_SHIFT)))
+        yaw = max(1000, min(2000, RC_BASE[2] + ((filtered_state[2] * RC_SPAN[2]) >> Q_SHIFT)))
+        throttle = max(1000, min(2000, RC_BASE[3] + ((filtered_state[3] * RC_SPAN[3]) >> Q_SHIFT)))
+
+        # Sub-microsecond filter jitter doesn't change the RC output; keep the
+        # current frame so idle sticks publish nothing
+        rc = self.rc_values
+        if roll == rc.roll and pitch == rc.pitch and yaw == rc.yaw and throttle == rc.throttle:
+            return
+
+        # Publish the whole frame with a single reference swap, so readers never
+        # see axes from two different frames
+        self.rc_values = AxisState(roll=roll, pitch=pitch, yaw=yaw, throttle=throttle)
 
     def get_rc_values(self):
-        """Return clamped RC values"""
-        def clamp(n):
-            return max(1000, min(2000, n))
-        
-        rc = {k: clamp(v) for k, v in self.rc_values.items()}
+        """Return clamped RC values.
+
+        The dict is cached and only rebuilt when the reader publishes a new
+        frame or test mode changes, so callers must treat it as read-only.
+        """
+        frame = self.rc_values
+        test_mode = self.test_mode_force_center
+        if frame is self._rc_cache_frame and test_mode == self._rc_cache_test_mode:
+            return self._rc_cache
+
+        # Frames are clamped when published
+        rc = frame.to_dict()
         
         # Test mode: Force roll and yaw to center (1500) to eliminate stick drift
-        if self.test_mode_force_center:
+        if test_mode:
             rc["roll"] = 1500
             rc["yaw"] = 1500
         
+        self._rc_cache = rc
+        self._rc_cache_frame = frame
+        self._rc_cache_test_mode = test_mode
         return rc
     
     def set_test_mode(self, enable=True):
@@ -214,6 +379,19 @@ class ControllerHandler:
         else:
             print("✅ TEST MODE: Disabled - Using actual controller values")
 
+    def wait_for_input(self, seen_seq, timeout):
+        """Block until input newer than seen_seq is processed or timeout (seconds) expires.
+
+        seen_seq is the input_seq read before the caller last looked at the
+        controller state; returns the current input_seq.
+        """
+        # Clear before checking, so a burst finishing after the check still
+        # sets the event and wakes us
+        self.input_ready.clear()
+        if self.input_seq == seen_seq:
+            self.input_ready.wait(max(0.0, timeout))
+        return self.input_seq
+
     def is_button_pressed(self, btn_code):
         """Check if a button is currently pressed (1)"""
         return self.buttons.get(btn_code, 0) == 1
@@ -228,16 +406,16 @@ class ControllerHandler:
 # BTN_SOUTH: X, BTN_EAST: Circle, BTN_NORTH: Triangle, BTN_WEST: Square
 # BTN_SELECT: Share, BTN_START: Options, BTN_MODE: PS Button
 class PS4Buttons:
-    X = ecodes.BTN_SOUTH
-    CIRCLE = ecodes.BTN_EAST
-    TRIANGLE = ecodes.BTN_NORTH
-    SQUARE = ecodes.BTN_WEST
-    SHARE = ecodes.BTN_SELECT
-    OPTIONS = ecodes.BTN_START
-    PS = ecodes.BTN_MODE
-    L1 = ecodes.BTN_TL
-    R1 = ecodes.BTN_TR
-    L2 = ecodes.BTN_TL2
-    R2 = ecodes.BTN_TR2
-    L3 = ecodes.BTN_THUMBL
-    R3 = ecodes.BTN_THUMBR
+    X = BTN_SOUTH
+    CIRCLE = BTN_EAST
+    TRIANGLE = BTN_NORTH
+    SQUARE = BTN_WEST
+    SHARE = BTN_SELECT
+    OPTIONS = BTN_START
+    PS = BTN_MODE
+    L1 = BTN_TL
+    R1 = BTN_TR
+    L2 = BTN_TL2
+    R2 = BTN_TR2
+    L3 = BTN_THUMBL
+    R3 = BTN_THUMBR
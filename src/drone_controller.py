@@ -1,8 +1,43 @@
 from pymavlink import mavutil
-import threading
+import select
 import time
 import math
 
+# Resend an unchanged RC override this often; ArduPilot holds the last one for
+# RC_OVERRIDE_TIME (3s by default) before falling back
+RC_KEEPALIVE_S = 0.5
+
+# ATTITUDE is in radians; the status display wants degrees
+RAD_TO_DEG = 180.0 / math.pi
+
+class DroneStatus:
+    """Telemetry snapshot with fixed slots, updated from incoming MAVLink messages"""
+    __slots__ = (
+        "armed", "mode", "mode_num",
+        "battery_v", "battery_a", "battery_remaining",
+        "roll", "pitch", "yaw", "alt", "throttle",
+        "gps_fix", "num_sats",
+        "groundspeed", "airspeed", "climb_rate"
+    )
+
+    def __init__(self):
+        self.armed = False
+        self.mode = "UNKNOWN"
+        self.mode_num = 0
+        self.battery_v = 0.0
+        self.battery_a = 0.0
+        self.battery_remaining = 100
+        self.roll = 0.0
+        self.pitch = 0.0
+        self.yaw = 0.0
+        self.alt = 0.0
+        self.throttle = 0
+        self.gps_fix = 0
+        self.num_sats = 0
+        self.groundspeed = 0.0
+        self.airspeed = 0.0
+        self.climb_rate = 0.0
+
 class DroneController:
     """Complete MAVLink drone control for RPi"""
     
@@ -11,25 +46,12 @@ class DroneController:
         self.connected = False
         self.debug_callback = print
         
+        # Last RC override sent, as (roll, pitch, throttle, yaw), and when
+        self._last_rc = None
+        self._last_rc_time = 0.0
+        
         # Status tracking
-        self.status = {
-            "armed": False,
-            "mode": "UNKNOWN",
-            "mode_num": 0,
-            "battery_v": 0.0,
-            "battery_a": 0.0,
-            "battery_remaining": 100,
-            "roll": 0.0,
-            "pitch": 0.0,
-            "yaw": 0.0,
-            "alt": 0.0,
-            "throttle": 0,
-            "gps_fix": 0,
-            "num_sats": 0,
-            "groundspeed": 0.0,
-            "airspeed": 0.0,
-            "climb_rate": 0.0
-        }
+        self.status = DroneStatus()
         
         # ArduCopter mode mapping
         self.mode_map = {
@@ -59,6 +81,16 @@ class DroneController:
             26: "AUTOROTATE",
             27: "AUTO_RTL"
         }
+        self.mode_name_to_id = {name: num for num, name in self.mode_map.items()}
+        
+        # Status update per MAVLink message type; other types are ignored
+        self._msg_handlers = {
+            'HEARTBEAT': self._on_heartbeat,
+            'ATTITUDE': self._on_attitude,
+            'SYS_STATUS': self._on_sys_status,
+            'VFR_HUD': self._on_vfr_hud,
+            'GPS_RAW_INT': self._on_gps_raw_int
+        }
         
     def set_debug_callback(self, callback):
         self.debug_callback = callback
@@ -89,65 +121,79 @@ class DroneController:
             return False
 
     def request_data_streams(self, rate=4):
-        """Request all data streams"""
+        """Request the telemetry messages we handle at rate Hz"""
         if not self.master:
             return
         
-        streams = [
-            mavutil.mavlink.MAV_DATA_STREAM_ALL,
-            mavutil.mavlink.MAV_DATA_STREAM_RAW_SENSORS,
-            mavutil.mavlink.MAV_DATA_STREAM_EXTENDED_STATUS,
-            mavutil.mavlink.MAV_DATA_STREAM_RC_CHANNELS,
-            mavutil.mavlink.MAV_DATA_STREAM_POSITION,
-            mavutil.mavlink.MAV_DATA_STREAM_EXTRA1,
-            mavutil.mavlink.MAV_DATA_STREAM_EXTRA2,
-            mavutil.mavlink.MAV_DATA_STREAM_EXTRA3
-        ]
-        
-        for stream in streams:
-            self.master.mav.request_data_stream_send(
+        # One MAV_CMD_SET_MESSAGE_INTERVAL per consumed message instead of
+        # every legacy data stream, so the link doesn't carry messages that
+        # process_messages would just drop. HEARTBEAT is always sent at 1Hz.
+        interval_us = int(1e6 / rate)
+        for msg_type in self._msg_handlers:
+            if msg_type == 'HEARTBEAT':
+                continue
+            self.master.mav.command_long_send(
                 self.master.target_system,
                 self.master.target_component,
-                stream,
-                rate,  # Hz
-                1   # Start
+                mavutil.mavlink.MAV_CMD_SET_MESSAGE_INTERVAL,
+                0,
+                getattr(mavutil.mavlink, f"MAVLINK_MSG_ID_{msg_type}"),
+                interval_us,
+                0, 0, 0, 0, 0
             )
 
+    def _on_heartbeat(self, msg):
+        self.status.mode_num = msg.custom_mode
+        self.status.mode = self.mode_map.get(msg.custom_mode, f"UNKNOWN({msg.custom_mode})")
+        self.status.armed = bool(msg.base_mode & mavutil.mavlink.MAV_MODE_FLAG_SAFETY_ARMED)
+
+    def _on_attitude(self, msg):
+        self.status.roll = msg.roll * RAD_TO_DEG
+        self.status.pitch = msg.pitch * RAD_TO_DEG
+        self.status.yaw = msg.yaw * RAD_TO_DEG
+
+    def _on_sys_status(self, msg):
+        self.status.battery_v = msg.voltage_battery / 1000.0
+        self.status.battery_a = msg.current_battery / 100.0
+        self.status.battery_remaining = msg.battery_remaining
+
+    def _on_vfr_hud(self, msg):
+        self.status.alt = msg.alt
+        self.status.throttle = msg.throttle
+        self.status.groundspeed = msg.groundspeed
+        self.status.airspeed = msg.airspeed
+        self.status.climb_rate = msg.climb
+
+    def _on_gps_raw_int(self, msg):
+        self.status.gps_fix = msg.fix_type
+        self.status.num_sats = msg.satellites_visible
+
     def process_messages(self, stop_event):
-        """Process incoming MAVLink messages in a thread"""
+        """Process incoming MAVLink messages in a thread.
+
+        Sleeps in select() on the link's fd until data arrives, then drains
+        every complete message before waiting again.
+        """
+        # Serial/UDP links expose a selectable fd; anything else is polled
+        fd = getattr(self.master, "fd", None)
+        handlers = self._msg_handlers
+        
         while not stop_event.is_set() and self.master:
             try:
-                msg = self.master.recv_match(blocking=False, timeout=0.01)
-                if msg:
-                    msg_type = msg.get_type()
-                    
-                    if msg_type == 'HEARTBEAT':
-                        self.status["mode_num"] = msg.custom_mode
-                        self.status["mode"] = self.mode_map.get(msg.custom_mode, f"UNKNOWN({msg.custom_mode})")
-                        self.status["armed"] = bool(msg.base_mode & mavutil.mavlink.MAV_MODE_FLAG_SAFETY_ARMED)
-                    
-                    elif msg_type == 'ATTITUDE':
-                        self.status["roll"] = math.degrees(msg.roll)
-                        self.status["pitch"] = math.degrees(msg.pitch)
-                        self.status["yaw"] = math.degrees(msg.yaw)
-                    
-                    elif msg_type == 'SYS_STATUS':
-                        self.status["battery_v"] = msg.voltage_battery / 1000.0
-                        self.status["battery_a"] = msg.current_battery / 100.0
-                        self.status["battery_remaining"] = msg.battery_remaining
-                    
-                    elif msg_type == 'VFR_HUD':
-                        self.status["alt"] = msg.alt
-                        self.status["throttle"] = msg.throttle
-                        self.status["groundspeed"] = msg.groundspeed
-                        self.status["airspeed"] = msg.airspeed
-                        self.status["climb_rate"] = msg.climb
-                        
-                    elif msg_type == 'GPS_RAW_INT':
-                        self.status["gps_fix"] = msg.fix_type
-                        self.status["num_sats"] = msg.satellites_visible
+                if fd is not None:
+                    # Timeout only bounds how long a stop request can go unnoticed
+                    select.select([fd], [], [], 0.5)
+                else:
+                    time.sleep(0.01)
                 
-                time.sleep(0.01)
+                # pymavlink may have buffered several messages from one read
+                while True:
+                    msg = self.master.recv_match(blocking=False)
+                    if not msg:
+                        break
+                    handler = handlers.get(msg.get_type())
+                    if handler:
+                        handler(msg)
             except Exception as e:
                 if not stop_event.is_set():
                     self.debug(f"❌ Message error: {e}")
@@ -158,7 +204,7 @@ class DroneController:
         if not self.master or not self.connected:
             return False
         
-        mode_id = next((num for num, name in self.mode_map.items() if name == mode_name), None)
+        mode_id = self.mode_name_to_id.get(mode_name)
         if mode_id is None:
             self.debug(f"❌ Unknown mode: {mode_name}")
             return False
@@ -217,13 +263,21 @@ class DroneController:
         """Send RC override (1000-2000, 1500 is center)"""
         if not self.master or not self.connected:
             return False
-            
+        
+        # Identical sticks only need a periodic keepalive
+        key = (roll, pitch, throttle, yaw)
+        now = time.monotonic()
+        if key == self._last_rc and now - self._last_rc_time < RC_KEEPALIVE_S:
+            return True
+        
         self.master.mav.rc_channels_override_send(
             self.master.target_system,
             self.master.target_component,
             roll, pitch, throttle, yaw,
             0, 0, 0, 0  # channels 5-8
         )
+        self._last_rc = key
+        self._last_rc_time = now
         return True
     
     def release_rc_override(self):
@@ -236,6 +290,7 @@ class DroneController:
             self.master.target_component,
             0, 0, 0, 0, 0, 0, 0, 0
         )
+        self._last_rc = None
         self.debug("→ RC override released")
         return True
 
@@ -249,4 +304,5 @@ class DroneController:
                 pass
         self.connected = False
         self.master = None
+        self._last_rc = None
         self.debug("Disconnected")
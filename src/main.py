@@ -1,22 +1,140 @@
-import os
+import signal
 import sys
 import time
 import threading
+from collections import deque
 from drone_controller import DroneController
 from controller_handler import ControllerHandler, PS4Buttons
 
 # Configuration
 MAVLINK_PORT = "/dev/ttyACM0"  # Default for USB connection to FC
 MAVLINK_BAUD = 115200
+CONTROL_RATE_HZ = 20   # Minimum control loop rate while the controller is idle
+MAX_RC_RATE_HZ = 50    # RC overrides follow controller input, but no faster than this
+DISPLAY_RATE_HZ = 2
 
-def clear_screen():
-    # Only move cursor to top-left. Don't clear screen to avoid flicker.
-    sys.stdout.write("\033[H")
-    sys.stdout.flush()
+# Flight mode bindings, looked up by button code / D-pad HAT value
+MODE_BUTTONS = {
+    PS4Buttons.TRIANGLE: "LOITER",
+    PS4Buttons.SQUARE: "ALT_HOLD"
+}
+DPAD_X_MODES = {-1: "STABILIZE", 1: "RTL"}  # HAT X: Left = -1, Right = 1
+DPAD_Y_MODES = {1: "LAND"}                  # HAT Y: Down = 1 (Up toggles test mode)
+
+# Buttons that send a command when pressed (edge-triggered; OPTIONS is checked separately)
+COMMAND_BUTTONS = (PS4Buttons.X, PS4Buttons.CIRCLE) + tuple(MODE_BUTTONS)
+
+# Static rows of the status screen, padded once at import
+UI_WIDTH = 60
+UI_FULL_REDRAW_S = 2.0  # Repaint every row at least this often, even if unchanged
+UI_SEP = ("=" * 52).ljust(UI_WIDTH)
+UI_RULE = ("-" * 52).ljust(UI_WIDTH)
+UI_TITLE = "🚁 RASPBERRY PI DRONE CONTROL (Headless)".ljust(UI_WIDTH)
+UI_LEGEND = " [X] ARM | [Circle] DISARM | [Options] KILL | [△/▢/D-Pad] MODES".ljust(UI_WIDTH)
+UI_TEST_ON = " 🧪 TEST: ON (R/Y=1500) | [D-Pad Up] Toggle".ljust(UI_WIDTH)
+UI_TEST_OFF = " 🧪 TEST: OFF | [D-Pad Up] Toggle".ljust(UI_WIDTH)
+
+def render_status(drone, handler, rc, previous=None):
+    """Draw the CMD status screen, rewriting only rows that differ from previous.
+
+    Returns the lines drawn, to be passed back as previous on the next call.
+    """
+    s = drone.status
+
+    # Voltage drop warning
+    voltage_warning = ""
+    if rc["throttle"] > 1170 and s.battery_v > 0:
+        # Check if voltage dropped significantly (you may need to adjust threshold)
+        voltage_warning = " ⚠️ VOLTAGE DROP DETECTED"
+
+    lines = (
+        UI_SEP,
+        UI_TITLE,
+        UI_SEP,
+        f" Status:  {'🔴 ARMED' if s.armed else '🟢 DISARMED'} | Mode: {s.mode}".ljust(UI_WIDTH),
+        f" Battery: {s.battery_v:.2f}V ({s.battery_remaining}%) | Current: {s.battery_a:.1f}A{voltage_warning}".ljust(UI_WIDTH),
+        f" GPS:     {s.gps_fix} Fix | Satellites: {s.num_sats}".ljust(UI_WIDTH),
+        f" Attitude: R:{s.roll:>5.1f}° | P:{s.pitch:>5.1f}° | Y:{s.yaw:>5.1f}°".ljust(UI_WIDTH),
+        f" Alt:      {s.alt:.1f}m | Speed: {s.groundspeed:.1f}m/s".ljust(UI_WIDTH),
+        UI_RULE,
+        f" 🎮 RC IN: T:{rc['throttle']:<4} | Y:{rc['yaw']:<4} | R:{rc['roll']:<4} | P:{rc['pitch']:<4}".ljust(UI_WIDTH),
+        UI_TEST_ON if handler.test_mode_force_center else UI_TEST_OFF,
+        UI_RULE,
+        UI_LEGEND,
+        f" DEBUG: Last Button Code Received: {handler.last_button}".ljust(UI_WIDTH),
+        UI_SEP
+    )
+
+    # Position the cursor on each changed row instead of repainting the whole
+    # block (don't clear the screen, to avoid flicker), then park it below
+    out = [
+        f"\033[{row};1H{line}"
+        for row, line in enumerate(lines, 1)
+        if previous is None or row > len(previous) or previous[row - 1] != line
+    ]
+    if out:
+        out.append(f"\033[{len(lines) + 1};1H")
+        sys.stdout.write("".join(out))
+        sys.stdout.flush()
+    return lines
+
+def status_key(drone, handler, rc):
+    """Everything the status screen shows, rounded to display precision"""
+    s = drone.status
+    return (
+        s.armed, s.mode,
+        round(s.battery_v, 2), s.battery_remaining, round(s.battery_a, 1),
+        s.gps_fix, s.num_sats,
+        round(s.roll, 1), round(s.pitch, 1), round(s.yaw, 1),
+        round(s.alt, 1), round(s.groundspeed, 1),
+        rc['throttle'], rc['yaw'], rc['roll'], rc['pitch'],
+        handler.test_mode_force_center, handler.last_button
+    )
+
+def display_loop(drone, handler, snapshots, screen_dirty, stop_event):
+    """Redraw the CMD display at DISPLAY_RATE_HZ from the newest RC snapshot.
+
+    Unchanged rows are skipped, but printed messages scroll the screen, so
+    everything is repainted after screen_dirty is set and every UI_FULL_REDRAW_S.
+    """
+    interval = 1.0 / DISPLAY_RATE_HZ
+    last_key = None
+    last_lines = None
+    next_full = 0.0
+    while not stop_event.wait(interval):
+        if not snapshots:
+            continue
+        rc = snapshots[-1]
+
+        now = time.monotonic()
+        if screen_dirty.is_set() or now >= next_full:
+            screen_dirty.clear()
+            last_key = None
+            last_lines = None
+            next_full = now + UI_FULL_REDRAW_S
+
+        # Skip formatting entirely when nothing visible has changed
+        key = status_key(drone, handler, rc)
+        if key != last_key:
+            last_lines = render_status(drone, handler, rc, last_lines)
+            last_key = key
+
+def handle_sigterm(signum, frame):
+    """Treat SIGTERM (e.g. systemctl stop) like Ctrl+C, so main() releases RC override on exit"""
+    raise KeyboardInterrupt
 
 def main():
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    
+    # Messages printed while the status screen is up mark it for a full repaint
+    screen_dirty = threading.Event()
+    def log(msg):
+        print(msg)
+        screen_dirty.set()
+    
     # 1. Initialize Drone Controller
     drone = DroneController()
+    drone.set_debug_callback(log)
     
     # 2. Initialize Controller Handler
     handler = ControllerHandler()
@@ -48,8 +166,21 @@ def main():
     print("🚀 System Ready! Switching to CMD Interface...")
     time.sleep(1)
 
+    # CMD display runs in its own thread so formatting and terminal writes
+    # never delay the control loop; it always draws the newest snapshot.
+    # Nobody is watching a redirected stdout, so don't draw at all then.
+    snapshots = deque(maxlen=1)
+    if sys.stdout.isatty():
+        display_thread = threading.Thread(target=display_loop, args=(drone, handler, snapshots, screen_dirty, stop_event), daemon=True)
+        display_thread.start()
+
     try:
-        iteration = 0
+        keepalive = 1.0 / CONTROL_RATE_HZ
+        min_interval = 1.0 / MAX_RC_RATE_HZ
+        tick = time.monotonic()
+        seen_seq = handler.input_seq
+        held = set()
+        last_dpad = (0, 0)
         while True:
             # 4. Read Controller Input
             rc = handler.get_rc_values()
@@ -63,47 +194,51 @@ def main():
                 drone.disarm()
                 break
             
+            # Commands below fire once per press, not on every loop iteration
+            # while a button is held (the loop can run at MAX_RC_RATE_HZ)
+            pressed = {button for button in COMMAND_BUTTONS if handler.is_button_pressed(button)}
+            new_presses = pressed - held
+            held = pressed
+            dpad = (handler.dpad["x"], handler.dpad["y"])
+            dpad_x = dpad[0] if dpad[0] != last_dpad[0] else 0
+            dpad_y = dpad[1] if dpad[1] != last_dpad[1] else 0
+            last_dpad = dpad
+            
             # ARM: X Button
             # Safety check: Only arm if throttle is low
-            if handler.is_button_pressed(PS4Buttons.X):
+            if PS4Buttons.X in new_presses:
                 if rc["throttle"] < 1100:
                     drone.arm()
                 else:
-                    # We can print this here, it will be visible for a split second or in console log
-                    sys.stdout.write("\n⚠️ Safety: Cannot ARM with throttle above minimum!\n")
+                    log("\n⚠️ Safety: Cannot ARM with throttle above minimum!")
             
             # DISARM: Circle Button
-            if handler.is_button_pressed(PS4Buttons.CIRCLE):
+            if PS4Buttons.CIRCLE in new_presses:
                 drone.disarm()
 
             # --- FLIGHT MODE SWITCHING ---
             
-            # LOITER: Triangle
-            if handler.is_button_pressed(PS4Buttons.TRIANGLE):
-                drone.set_mode("LOITER")
-            
-            # ALT_HOLD: Square
-            if handler.is_button_pressed(PS4Buttons.SQUARE):
-                drone.set_mode("ALT_HOLD")
-            
-            # STABILIZE: D-Pad Left (HAT X = -1)
-            if handler.dpad["x"] == -1:
-                drone.set_mode("STABILIZE")
+            # LOITER: Triangle | ALT_HOLD: Square
+            for button, mode in MODE_BUTTONS.items():
+                if button in new_presses:
+                    drone.set_mode(mode)
             
-            # RTL: D-Pad Right (HAT X = 1)
-            if handler.dpad["x"] == 1:
-                drone.set_mode("RTL")
+            # STABILIZE / RTL: D-Pad Left / Right
+            mode = DPAD_X_MODES.get(dpad_x)
+            if mode:
+                drone.set_mode(mode)
             
-            # LAND: D-Pad Down (HAT Y = 1)
-            if handler.dpad["y"] == 1:
-                drone.set_mode("LAND")
+            # LAND: D-Pad Down
+            mode = DPAD_Y_MODES.get(dpad_y)
+            if mode:
+                drone.set_mode(mode)
             
             # TEST MODE: D-Pad Up (HAT Y = -1) - Toggle force center for roll/yaw
-            if handler.dpad["y"] == -1:
+            if dpad_y == -1:
                 handler.set_test_mode(not handler.test_mode_force_center)
-                time.sleep(0.3)  # Debounce
+                screen_dirty.set()
 
-            # 6. Send RC Overrides to Drone (FAST: 20Hz)
+            # 6. Send RC Overrides to Drone (FAST: 20-50Hz)
             drone.send_rc_override(
                 roll=rc["roll"],
                 pitch=rc["pitch"],
@@ -111,40 +246,18 @@ def main():
                 yaw=rc["yaw"]
             )
 
-            # 7. Update CMD Display (SLOW: 2Hz)
-            if iteration % 10 == 0:
-                s = drone.status
-                clear_screen()
-                
-                # Voltage drop warning
-                voltage_warning = ""
-                if rc["throttle"] > 1170 and s['battery_v'] > 0:
-                    # Check if voltage dropped significantly (you may need to adjust threshold)
-                    voltage_warning = " ⚠️ VOLTAGE DROP DETECTED"
-                
-                lines = [
-                    "====================================================".ljust(60),
-                    "🚁 RASPBERRY PI DRONE CONTROL (Headless)".ljust(60),
-                    "====================================================".ljust(60),
-                    f" Status:  {'🔴 ARMED' if s['armed'] else '🟢 DISARMED'} | Mode: {s['mode']}".ljust(60),
-                    f" Battery: {s['battery_v']:.2f}V ({s['battery_remaining']}%) | Current: {s['battery_a']:.1f}A{voltage_warning}".ljust(60),
-                    f" GPS:     {s['gps_fix']} Fix | Satellites: {s['num_sats']}".ljust(60),
-                    f" Attitude: R:{s['roll']:>5.1f}° | P:{s['pitch']:>5.1f}° | Y:{s['yaw']:>5.1f}°".ljust(60),
-                    f" Alt:      {s['alt']:.1f}m | Speed: {s['groundspeed']:.1f}m/s".ljust(60),
-                    "----------------------------------------------------".ljust(60),
-                    f" 🎮 RC IN: T:{rc['throttle']:<4} | Y:{rc['yaw']:<4} | R:{rc['roll']:<4} | P:{rc['pitch']:<4}".ljust(60),
-                    f" 🧪 TEST: {'ON (R/Y=1500)' if handler.test_mode_force_center else 'OFF'} | [D-Pad Up] Toggle".ljust(60),
-                    "----------------------------------------------------".ljust(60),
-                    f" [X] ARM | [Circle] DISARM | [Options] KILL | [△/▢/D-Pad] MODES".ljust(60),
-                    f" DEBUG: Last Button Code Received: {handler.last_button}".ljust(60),
-                    "====================================================".ljust(60)
-                ]
-                
-                sys.stdout.write("\n".join(lines) + "\n")
-                sys.stdout.flush()
-            
-            iteration += 1
-            time.sleep(0.05) # Loop runs at 20Hz
+            # 7. Hand the latest RC snapshot to the display thread
+            snapshots.append(rc)
+
+            # 8. Wake up on the next controller frame instead of a fixed sleep,
+            # bounded by the keepalive deadline and the maximum send rate
+            seen_seq = handler.wait_for_input(seen_seq, tick + keepalive - time.monotonic())
+            now = time.monotonic()
+            earliest = tick + min_interval
+            if now < earliest:
+                time.sleep(earliest - now)
+                now = earliest
+            tick = now
 
     except KeyboardInterrupt:
         print("\n👋 Exiting safely...")